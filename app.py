@@ -11,6 +11,8 @@ sys.path.append('study_planner_flask')
 
 # Import models and database
 from study_planner_flask.models import db, User
+from study_planner_flask.sharding import init_sharding, create_shard_tables, read_only
+from study_planner_flask.template_cache import init_template_cache
 
 # Import blueprints
 from study_planner_flask.auth.routes import auth_bp
@@ -25,6 +27,8 @@ def create_app():
     
     # Initialize extensions
     db.init_app(app)
+    init_sharding(app)
+    init_template_cache(app)
     login_manager = LoginManager()
     login_manager.login_view = "auth.login"
     login_manager.init_app(app)
@@ -40,6 +44,7 @@ def create_app():
     # Initialize database
     with app.app_context():
         db.create_all()
+        create_shard_tables()
     
     return app
 
@@ -55,6 +60,7 @@ def index():
 
 @app.route("/dashboard")
 @login_required
+@read_only
 def dashboard():
     from study_planner_flask.models import Task, Subject
     from datetime import date
@@ -65,6 +71,7 @@ def dashboard():
 
 @app.route("/calendar")
 @login_required
+@read_only
 def calendar():
     from study_planner_flask.models import Task
     tasks = Task.query.filter_by(user_id=current_user.id).all()
@@ -82,6 +89,7 @@ def debug_buttons():
 
 @app.route("/progress")
 @login_required
+@read_only
 def progress():
     from study_planner_flask.models import Subject, StudyLog
     from datetime import date, timedelta
@@ -94,7 +102,10 @@ def progress():
         StudyLog.date >= thirty_days_ago
     ).all()
     
-    return render_template("progress.html", subjects=subjects, study_logs=study_logs)
+    today = date.today()
+    week_ago = today - timedelta(days=7)
+    return render_template("progress.html", subjects=subjects, study_logs=study_logs,
+                           today=today, week_ago=week_ago)
 
 @app.route("/settings")
 @login_required
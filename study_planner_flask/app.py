@@ -7,6 +7,8 @@ import os
 
 # Import models and database
 from models import db, User
+from sharding import init_sharding, create_shard_tables, read_only
+from template_cache import init_template_cache
 
 # Import blueprints
 from auth.routes import auth_bp
@@ -19,6 +21,8 @@ def create_app():
     
     # Initialize extensions
     db.init_app(app)
+    init_sharding(app)
+    init_template_cache(app)
     login_manager = LoginManager()
     login_manager.login_view = "auth.login"
     login_manager.init_app(app)
@@ -34,6 +38,7 @@ def create_app():
     # Initialize database
     with app.app_context():
         db.create_all()
+        create_shard_tables()
     
     return app
 
@@ -49,6 +54,7 @@ def index():
 
 @app.route("/dashboard")
 @login_required
+@read_only
 def dashboard():
     from models import Task, Subject
     from datetime import date
@@ -59,6 +65,7 @@ def dashboard():
 
 @app.route("/calendar")
 @login_required
+@read_only
 def calendar():
     from models import Task
     tasks = Task.query.filter_by(user_id=current_user.id).all()
@@ -76,6 +83,7 @@ def debug_buttons():
 
 @app.route("/progress")
 @login_required
+@read_only
 def progress():
     from models import Subject, StudyLog
     from datetime import date, timedelta
@@ -88,7 +96,10 @@ def progress():
         StudyLog.date >= thirty_days_ago
     ).all()
     
-    return render_template("progress.html", subjects=subjects, study_logs=study_logs)
+    today = date.today()
+    week_ago = today - timedelta(days=7)
+    return render_template("progress.html", subjects=subjects, study_logs=study_logs,
+                           today=today, week_ago=week_ago)
 
 @app.route("/settings")
 @login_required
@@ -1,6 +1,10 @@
 import os
 from datetime import timedelta
 
+def _env_pairs(name):
+    """Parse a "key=value,key=value" environment variable"""
+    return [item.split('=', 1) for item in os.environ.get(name, '').split(',') if item]
+
 class Config:
     # Basic Flask Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
@@ -9,6 +13,25 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///study_planner.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Sharding Configuration (see sharding.py)
+    # SQLALCHEMY_BINDS="shard0=sqlite:///shard0.db,shard0_replica=sqlite:///shard0_replica.db"
+    SQLALCHEMY_BINDS = dict(_env_pairs('SQLALCHEMY_BINDS'))
+    # SHARD_BINDS="shard0,shard1" - binds holding per-user tables; empty disables sharding
+    SHARD_BINDS = [key for key in os.environ.get('SHARD_BINDS', '').split(',') if key]
+    SHARD_STRATEGY = os.environ.get('SHARD_STRATEGY') or 'hash'  # hash, range
+    # SHARD_RANGE_BOUNDS="1000" - user ids below 1000 go to the first shard
+    SHARD_RANGE_BOUNDS = [int(b) for b in os.environ.get('SHARD_RANGE_BOUNDS', '').split(',') if b]
+    # SHARD_REPLICAS="shard0=shard0_replica|shard0_replica2" - replica binds for read-only views
+    SHARD_REPLICAS = {key: replicas.split('|') for key, replicas in _env_pairs('SHARD_REPLICAS')}
+    # Read from the shard primary for this long after a user's own write
+    SHARD_REPLICA_READ_AFTER_WRITE_SECONDS = int(os.environ.get('SHARD_REPLICA_READ_AFTER_WRITE_SECONDS') or 30)
+    
+    # Template Cache Configuration (see template_cache.py)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # defaults to <instance>/jinja_cache
+    FRAGMENT_CACHE_TIMEOUT = 300  # seconds
+    FRAGMENT_CACHE_MAX_ENTRIES = 1000  # per worker
+    TEMPLATE_RENDER_REPORT = os.environ.get('TEMPLATE_RENDER_REPORT') == '1'
+    
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
@@ -0,0 +1,306 @@
+"""User-sharded database routing for the Flask-SQLAlchemy layer.
+
+Every per-user table (subjects, tasks, exams, study logs) is keyed by
+``user_id``. When ``SHARD_BINDS`` is configured those tables are routed to one
+of the listed ``SQLALCHEMY_BINDS`` based on the user id, while the ``user``
+table stays on ``SQLALCHEMY_DATABASE_URI`` as the user directory. Views
+decorated with ``read_only`` send their queries to a replica of the shard
+when ``SHARD_REPLICAS`` lists one; writes always go to the shard primary, and
+a user who wrote within ``SHARD_REPLICA_READ_AFTER_WRITE_SECONDS`` keeps
+reading from the primary so they see their own changes.
+
+With no ``SHARD_BINDS`` configured every query goes to the default database,
+exactly as before.
+"""
+import random
+import time
+import zlib
+from bisect import bisect_right
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+import click
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context
+from flask import session as flask_session
+from flask.cli import AppGroup
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from study_planner_flask.template_cache import bump_all_data_versions, bump_data_version
+
+# Tables partitioned by user_id, parents before children
+SHARDED_TABLES = ('subject', 'task', 'exam', 'study_log')
+SHARD_STRATEGIES = ('hash', 'range')
+
+_shard_user_id = ContextVar('shard_user_id', default=None)
+
+
+def shard_key_for(user_id, config=None):
+    """Return the bind key holding the data for ``user_id``"""
+    config = config if config is not None else current_app.config
+    binds = config.get('SHARD_BINDS') or []
+    if not binds:
+        return None
+    if config.get('SHARD_STRATEGY', 'hash') == 'range':
+        return binds[bisect_right(config['SHARD_RANGE_BOUNDS'], user_id)]
+    return binds[zlib.crc32(str(user_id).encode()) % len(binds)]
+
+
+@contextmanager
+def use_shard(user_id):
+    """Route sharded tables for ``user_id`` outside of a logged-in request"""
+    token = _shard_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        _shard_user_id.reset(token)
+
+
+def read_only(view):
+    """Mark a view as read-only so its queries may be served by a replica"""
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return decorated_view
+
+
+def _routing_user_id():
+    user_id = _shard_user_id.get()
+    if user_id is not None:
+        return user_id
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def _table_name(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table.name
+    table = getattr(clause, 'table', None)
+    return getattr(table, 'name', None)
+
+
+def _recently_wrote():
+    window = current_app.config.get('SHARD_REPLICA_READ_AFTER_WRITE_SECONDS', 0)
+    return time.time() - flask_session.get('shard_last_write', 0) < window
+
+
+class RoutingSession(Session):
+    """Session that picks a shard (or shard replica) per user"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and current_app.config.get('SHARD_BINDS'):
+            if _table_name(mapper, clause) in SHARDED_TABLES:
+                return self._db.engines[self._route(clause)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _route(self, clause):
+        user_id = _routing_user_id()
+        if user_id is None:
+            raise RuntimeError(
+                "No user to route sharded query to; wrap the code in use_shard(user_id)"
+            )
+        key = shard_key_for(user_id)
+        is_write = self._flushing or isinstance(clause, UpdateBase)
+        if not has_request_context():
+            return key
+        if is_write:
+            flask_session['shard_last_write'] = time.time()
+        elif g.get('db_read_only') and not _recently_wrote():
+            replicas = current_app.config.get('SHARD_REPLICAS', {}).get(key)
+            if replicas:
+                return random.choice(replicas)
+        return key
+
+
+# ---------------- Setup ----------------
+def init_sharding(app):
+    """Validate the shard configuration and register the ``flask shards`` CLI"""
+    binds = app.config.get('SHARD_BINDS') or []
+    known = app.config.get('SQLALCHEMY_BINDS') or {}
+    replicas = app.config.get('SHARD_REPLICAS') or {}
+    for key in binds + [r for key in binds for r in replicas.get(key, [])]:
+        if key not in known:
+            raise RuntimeError(f"Shard bind '{key}' is missing from SQLALCHEMY_BINDS")
+    strategy = app.config.get('SHARD_STRATEGY', 'hash')
+    if strategy not in SHARD_STRATEGIES:
+        raise RuntimeError(f"SHARD_STRATEGY must be one of {', '.join(SHARD_STRATEGIES)}, got '{strategy}'")
+    if binds and strategy == 'range':
+        bounds = app.config.get('SHARD_RANGE_BOUNDS') or []
+        if len(bounds) != len(binds) - 1 or bounds != sorted(bounds):
+            raise RuntimeError("SHARD_RANGE_BOUNDS needs one ascending bound between each pair of shards")
+    app.cli.add_command(shards_cli)
+
+
+def create_shard_tables():
+    """Create the per-user tables on every shard and replica (app context required)"""
+    metadata = _shard_metadata()
+    for key in _shard_nodes(include_replicas=True):
+        metadata.create_all(_engines()[key])
+
+
+def _shard_metadata():
+    """Copy the sharded tables without their foreign key to ``user``.
+
+    The ``user`` table lives on the primary only, so backends that enforce
+    foreign keys would reject the cross-database reference.
+    """
+    metadata = sa.MetaData()
+    for table in _sharded_tables():
+        shard_table = table.to_metadata(metadata)
+        for constraint in list(shard_table.foreign_key_constraints):
+            if any(fk.target_fullname.startswith('user.') for fk in constraint.elements):
+                shard_table.constraints.discard(constraint)
+                for fk in constraint.elements:
+                    shard_table.foreign_keys.discard(fk)
+                    fk.parent.foreign_keys.discard(fk)
+    return metadata
+
+
+def _engines():
+    return current_app.extensions['sqlalchemy'].engines
+
+
+def _metadata():
+    return current_app.extensions['sqlalchemy'].metadata
+
+
+def _sharded_tables():
+    tables = _metadata().tables
+    return [tables[name] for name in SHARDED_TABLES]
+
+
+def _shard_nodes(include_replicas=False):
+    binds = current_app.config.get('SHARD_BINDS') or []
+    if not include_replicas:
+        return list(binds)
+    replicas = current_app.config.get('SHARD_REPLICAS') or {}
+    return list(binds) + [r for key in binds for r in replicas.get(key, [])]
+
+
+def _node_name(key):
+    return key or 'primary'
+
+
+def _users_on(engine):
+    tables = _sharded_tables()
+    query = sa.union(*[sa.select(t.c.user_id) for t in tables])
+    with engine.connect() as conn:
+        return sorted(row[0] for row in conn.execute(query))
+
+
+def _existing_id(conn, table, values):
+    """Return the id of a row on ``conn`` matching ``values`` in every column"""
+    query = sa.select(table.c.id).where(*[table.c[name] == value for name, value in values.items()])
+    return conn.execute(query.limit(1)).scalar()
+
+
+def _copy_row(conn, table, values):
+    """Insert ``values`` unless an identical row is already there; return (id, copied)"""
+    existing = _existing_id(conn, table, values)
+    if existing is not None:
+        return existing, False
+    return conn.execute(sa.insert(table).values(**values)).inserted_primary_key[0], True
+
+
+def _move_user(user_id, source, target):
+    """Merge a user's rows from ``source`` into ``target`` and delete the originals.
+
+    Rows already on the target are never touched: the app may have written
+    there before the rebalance ran. Primary keys are reassigned by the target
+    and subject ids remapped. The target commits before the source, so a
+    failure part way leaves a copy on both; a rerun recognises rows already
+    copied (identical in every column but ``id``) and only deletes them from
+    the source.
+    """
+    subject, *children = _sharded_tables()
+    moved = 0
+    with source.begin() as src:
+        with target.begin() as dst:
+            subject_ids = {}
+            for row in src.execute(sa.select(subject).where(subject.c.user_id == user_id)).mappings():
+                values = dict(row)
+                old_id = values.pop('id')
+                subject_ids[old_id], copied = _copy_row(dst, subject, values)
+                moved += copied
+            for table in children:
+                for row in src.execute(sa.select(table).where(table.c.user_id == user_id)).mappings():
+                    values = dict(row)
+                    values.pop('id')
+                    values['subject_id'] = subject_ids.get(values['subject_id'], values['subject_id'])
+                    _, copied = _copy_row(dst, table, values)
+                    moved += copied
+        for table in reversed(_sharded_tables()):
+            src.execute(sa.delete(table).where(table.c.user_id == user_id))
+    return moved
+
+
+# ---------------- CLI ----------------
+shards_cli = AppGroup('shards', help="Manage user-sharded database binds.")
+
+
+@shards_cli.command('status')
+def status_command():
+    """Show how many users and rows each node holds."""
+    engines = _engines()
+    for key in [None] + _shard_nodes(include_replicas=True):
+        with engines[key].connect() as conn:
+            counts = {t.name: conn.execute(sa.select(sa.func.count()).select_from(t)).scalar()
+                      for t in _sharded_tables()}
+        users = len(_users_on(engines[key]))
+        click.echo(f"{_node_name(key)}: {users} users, " +
+                   ", ".join(f"{name}={count}" for name, count in counts.items()))
+
+
+@shards_cli.command('rebalance')
+@click.option('--dry-run', is_flag=True, help="Only report the moves that would be made.")
+def rebalance_command(dry_run):
+    """Move each user's rows to the shard the current config maps them to.
+
+    Also migrates rows still stored on the primary database from before
+    sharding was enabled.
+    """
+    if not current_app.config.get('SHARD_BINDS'):
+        raise click.ClickException("SHARD_BINDS is not configured")
+    engines = _engines()
+    total = 0
+    for source in [None] + _shard_nodes():
+        for user_id in _users_on(engines[source]):
+            target = shard_key_for(user_id)
+            if target == source:
+                continue
+            if dry_run:
+                click.echo(f"user {user_id}: {_node_name(source)} -> {target}")
+            else:
+                moved = _move_user(user_id, engines[source], engines[target])
+                # Cached fragments still carry the old primary keys
+                bump_data_version(user_id)
+                click.echo(f"user {user_id}: {_node_name(source)} -> {target} ({moved} rows)")
+            total += 1
+    click.echo(f"{total} user(s) {'to move' if dry_run else 'moved'}")
+
+
+@shards_cli.command('sync-replicas')
+def sync_replicas_command():
+    """Copy every shard onto its replicas.
+
+    Stands in for database replication when the nodes are local SQLite files.
+    """
+    engines = _engines()
+    replicas = current_app.config.get('SHARD_REPLICAS') or {}
+    for key in _shard_nodes():
+        for replica in replicas.get(key, []):
+            with engines[key].connect() as src, engines[replica].begin() as dst:
+                for table in reversed(_sharded_tables()):
+                    dst.execute(sa.delete(table))
+                for table in _sharded_tables():
+                    rows = [dict(row) for row in src.execute(sa.select(table)).mappings()]
+                    if rows:
+                        dst.execute(sa.insert(table), rows)
+            click.echo(f"{key} -> {replica}")
+    # Fragments rendered from the stale replicas must not outlive the sync
+    bump_all_data_versions()
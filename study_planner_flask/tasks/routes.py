@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from study_planner_flask.models import db, Task, Subject, Exam
 from study_planner_flask.forms import TaskForm, ExamForm, SubjectForm
+from study_planner_flask.sharding import read_only
+from study_planner_flask.template_cache import invalidates_fragments, bump_data_version
 from datetime import datetime, timedelta
 
 tasks_bp = Blueprint('tasks', __name__)
@@ -20,12 +22,14 @@ def get_subject_choices():
             )
             db.session.add(default_subject)
             db.session.commit()
+            bump_data_version(current_user.id)
             subjects = [default_subject]
         
         return [(s.id, s.name) for s in subjects]
 
 @tasks_bp.route("/new", methods=["GET", "POST"])
 @login_required
+@invalidates_fragments
 def add_task():
     form = TaskForm()
     form.subject_id.choices = get_subject_choices()
@@ -55,6 +59,7 @@ def add_task():
 
 @tasks_bp.route("/<int:task_id>/edit", methods=["GET", "POST"])
 @login_required
+@invalidates_fragments
 def edit_task(task_id):
     with current_app.app_context():
         task = Task.query.get_or_404(task_id)
@@ -85,6 +90,7 @@ def edit_task(task_id):
 
 @tasks_bp.route("/<int:task_id>/complete", methods=["POST"])
 @login_required
+@invalidates_fragments
 def complete_task(task_id):
     with current_app.app_context():
         task = Task.query.get_or_404(task_id)
@@ -99,6 +105,7 @@ def complete_task(task_id):
 
 @tasks_bp.route("/<int:task_id>/delete", methods=["POST"])
 @login_required
+@invalidates_fragments
 def delete_task(task_id):
     with current_app.app_context():
         task = Task.query.get_or_404(task_id)
@@ -113,6 +120,7 @@ def delete_task(task_id):
 
 @tasks_bp.route("/exam/new", methods=["GET", "POST"])
 @login_required
+@invalidates_fragments
 def add_exam():
     form = ExamForm()
     form.subject_id.choices = get_subject_choices()
@@ -139,6 +147,7 @@ def add_exam():
 # Subject Management Routes
 @tasks_bp.route("/subjects", methods=["GET", "POST"])
 @login_required
+@invalidates_fragments
 def manage_subjects():
     form = SubjectForm()
     subjects = Subject.query.filter_by(user_id=current_user.id).all()
@@ -160,6 +169,7 @@ def manage_subjects():
 
 @tasks_bp.route("/subjects/<int:subject_id>/edit", methods=["GET", "POST"])
 @login_required
+@invalidates_fragments
 def edit_subject(subject_id):
     subject = Subject.query.get_or_404(subject_id)
     if subject.user_id != current_user.id:
@@ -182,6 +192,7 @@ def edit_subject(subject_id):
 
 @tasks_bp.route("/subjects/<int:subject_id>/delete", methods=["POST"])
 @login_required
+@invalidates_fragments
 def delete_subject(subject_id):
     subject = Subject.query.get_or_404(subject_id)
     if subject.user_id != current_user.id:
@@ -200,6 +211,7 @@ def delete_subject(subject_id):
 
 @tasks_bp.route("/api/events")
 @login_required
+@read_only
 def get_events():
     """API endpoint for FullCalendar events"""
     tasks = Task.query.filter_by(user_id=current_user.id).all()
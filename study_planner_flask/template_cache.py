@@ -0,0 +1,199 @@
+"""Template caching for the heavy per-user pages.
+
+Three pieces, all set up by ``init_template_cache``:
+
+* a filesystem Jinja bytecode cache shared by every worker on the host, so
+  templates are compiled once rather than once per worker boot;
+* a ``{% cache "name", extra_key %}...{% endcache %}`` tag that caches a
+  rendered fragment per user and data version. Views decorated with
+  ``invalidates_fragments`` bump the user's data version on POST, which
+  orphans every fragment rendered before the change. The version is read
+  before the view runs, so a concurrent bump can never label HTML built from
+  older data with the newer version. ``bump_all_data_versions``
+  does the same for every user, e.g. after replicas are resynced;
+* an optional render-time report (``TEMPLATE_RENDER_REPORT``) that times each
+  template and block, records fragment hits and misses, and returns them in a
+  ``Server-Timing`` header and the app log.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, Template, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+# Rendered fragments for this worker: key -> (expires_at, html)
+_fragments = {}
+_fragments_lock = threading.Lock()
+
+
+def init_template_cache(app):
+    """Attach the bytecode cache, fragment cache and render report to ``app``"""
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(os.path.join(cache_dir, 'versions'), exist_ok=True)
+    app.config['TEMPLATE_CACHE_DIR'] = cache_dir
+
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.before_request(_snapshot_data_version)
+    if app.config.get('TEMPLATE_RENDER_REPORT'):
+        app.jinja_env.template_class = TimedTemplate
+        app.after_request(_render_report)
+        # Flask's logger only lets WARNING through outside debug mode
+        if app.logger.getEffectiveLevel() > logging.INFO:
+            app.logger.setLevel(logging.INFO)
+
+
+# ---------------- Data versions ----------------
+# Version file shared by all users; bumping it invalidates every fragment
+_ALL_USERS = '_all'
+
+
+def _version_path(name):
+    return os.path.join(current_app.config['TEMPLATE_CACHE_DIR'], 'versions', str(name))
+
+
+def _read_version(name):
+    versions = g.setdefault('fragment_versions', {}) if has_request_context() else {}
+    if name not in versions:
+        try:
+            with open(_version_path(name)) as f:
+                versions[name] = f.read()
+        except FileNotFoundError:
+            versions[name] = '0'
+    return versions[name]
+
+
+def _write_version(name):
+    path = _version_path(name)
+    tmp_path = f"{path}.{uuid.uuid4().hex}"
+    with open(tmp_path, 'w') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+    if has_request_context():
+        g.pop('fragment_versions', None)
+
+
+def data_version(user_id):
+    """Return the user's current data version (cached for the request)"""
+    return f"{_read_version(_ALL_USERS)}.{_read_version(user_id)}"
+
+
+def _snapshot_data_version():
+    if current_user.is_authenticated:
+        g.fragment_data_version = data_version(current_user.id)
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached fragment for ``user_id`` across all workers"""
+    _write_version(user_id)
+
+
+def bump_all_data_versions():
+    """Invalidate every cached fragment for all users across all workers"""
+    _write_version(_ALL_USERS)
+
+
+def invalidates_fragments(view):
+    """Bump the current user's data version after a POST to ``view``"""
+    @wraps(view)
+    def decorated_view(*args, **kwargs):
+        response = view(*args, **kwargs)
+        if request.method == 'POST' and current_user.is_authenticated:
+            bump_data_version(current_user.id)
+        return response
+    return decorated_view
+
+
+# ---------------- Fragment cache ----------------
+class FragmentCacheExtension(Extension):
+    """``{% cache "name"[, extra, ...] %}...{% endcache %}`` per-user fragment cache"""
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render_fragment', [nodes.List(args)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, args, caller):
+        if not has_request_context() or not current_user.is_authenticated:
+            return caller()
+
+        name = args[0]
+        version = g.get('fragment_data_version') or data_version(current_user.id)
+        key = ':'.join(str(part) for part in [name, current_user.id, version] + args[1:])
+        start = time.perf_counter()
+        now = time.monotonic()
+        with _fragments_lock:
+            cached = _fragments.get(key)
+        if cached and cached[0] > now:
+            _record('fragment', name, 'hit', time.perf_counter() - start)
+            return cached[1]
+
+        html = Markup(caller())
+        _record('fragment', name, 'miss', time.perf_counter() - start)
+
+        max_entries = current_app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 1000)
+        expires_at = now + current_app.config.get('FRAGMENT_CACHE_TIMEOUT', 300)
+        with _fragments_lock:
+            if len(_fragments) >= max_entries:
+                # Drop the oldest entry; stale versions age out this way
+                _fragments.pop(next(iter(_fragments)))
+            _fragments[key] = (expires_at, html)
+        return html
+
+
+# ---------------- Render report ----------------
+def _record(kind, name, detail, seconds):
+    if has_request_context() and current_app.config.get('TEMPLATE_RENDER_REPORT'):
+        g.setdefault('render_report', []).append((kind, name, detail, seconds))
+
+
+def _timed_block(template_name, block_name, render_func):
+    def render_block(context):
+        start = time.perf_counter()
+        try:
+            yield from render_func(context)
+        finally:
+            _record('block', template_name, block_name, time.perf_counter() - start)
+    return render_block
+
+
+class TimedTemplate(Template):
+    """Template that records its own render time and that of each block"""
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            _record('template', self.name, 'total', time.perf_counter() - start)
+
+    def new_context(self, vars=None, shared=False, locals=None):
+        context = super().new_context(vars, shared, locals)
+        for block_name, funcs in context.blocks.items():
+            if funcs and funcs[0] is self.blocks.get(block_name):
+                funcs[0] = _timed_block(self.name, block_name, funcs[0])
+        return context
+
+
+def _render_report(response):
+    report = g.pop('render_report', None)
+    if not report:
+        return response
+    timings = []
+    for i, (kind, name, detail, seconds) in enumerate(report):
+        timings.append(f'{kind}{i};dur={seconds * 1000:.2f};desc="{name} {detail}"')
+        current_app.logger.info("render %s %s %s %.2fms", kind, name, detail, seconds * 1000)
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
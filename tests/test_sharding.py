@@ -0,0 +1,86 @@
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+
+from study_planner_flask.models import db, User, Subject, Task
+from study_planner_flask.sharding import init_sharding, create_shard_tables, use_shard
+from study_planner_flask.template_cache import init_template_cache
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App with a primary and two shards, each a separate SQLite file"""
+    app = Flask(__name__, instance_path=str(tmp_path / 'instance'))
+    app.config.update(
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        SQLALCHEMY_BINDS={
+            'shard0': f"sqlite:///{tmp_path / 'shard0.db'}",
+            'shard1': f"sqlite:///{tmp_path / 'shard1.db'}",
+        },
+        SHARD_BINDS=['shard0', 'shard1'],
+        # user 1 lands on shard1
+        SHARD_STRATEGY='range',
+        SHARD_RANGE_BOUNDS=[1],
+    )
+    db.init_app(app)
+    init_sharding(app)
+    init_template_cache(app)
+    with app.app_context():
+        db.create_all()
+        create_shard_tables()
+        db.session.add(User(name='u', email='u@example.com', password_hash='x'))
+        db.session.commit()
+    return app
+
+
+def _add_legacy_subject(app, user_id):
+    """Write a subject straight onto the primary, as before sharding was enabled"""
+    subject = db.metadata.tables['subject']
+    with app.app_context(), db.engine.begin() as conn:
+        stamp = datetime(2025, 1, 1)
+        conn.execute(subject.insert().values(user_id=user_id, name='legacy', created_at=stamp, updated_at=stamp))
+
+
+def _add_sharded_task(app, user_id):
+    with app.app_context(), use_shard(user_id):
+        subject = Subject(user_id=user_id, name='new')
+        db.session.add(subject)
+        db.session.commit()
+        db.session.add(Task(user_id=user_id, subject_id=subject.id, title='task', due_date=date(2026, 1, 1)))
+        db.session.commit()
+
+
+def _user_data(app, user_id):
+    with app.app_context(), use_shard(user_id):
+        subjects = sorted(s.name for s in Subject.query.filter_by(user_id=user_id))
+        tasks = [(t.title, t.subject.name) for t in Task.query.filter_by(user_id=user_id)]
+        db.session.remove()
+        return subjects, tasks
+
+
+def test_rebalance_merges_legacy_rows_with_new_shard_rows(app):
+    _add_legacy_subject(app, 1)
+    _add_sharded_task(app, 1)
+
+    result = app.test_cli_runner().invoke(args=['shards', 'rebalance'])
+
+    assert result.exit_code == 0, result.output
+    assert _user_data(app, 1) == (['legacy', 'new'], [('task', 'new')])
+    with app.app_context():
+        subject = db.metadata.tables['subject']
+        assert db.session.execute(db.select(subject)).all() == []
+
+
+def test_rebalance_rerun_after_failed_source_delete_does_not_duplicate(app):
+    _add_legacy_subject(app, 1)
+    _add_sharded_task(app, 1)
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['shards', 'rebalance']).exit_code == 0
+
+    # Simulate the source delete failing: the legacy row is back on the primary
+    _add_legacy_subject(app, 1)
+    assert runner.invoke(args=['shards', 'rebalance']).exit_code == 0
+
+    assert _user_data(app, 1) == (['legacy', 'new'], [('task', 'new')])
@@ -0,0 +1,41 @@
+import pytest
+from flask import Flask, render_template
+from flask_login import FlaskLoginClient, LoginManager, UserMixin
+from jinja2 import DictLoader
+
+from study_planner_flask.template_cache import bump_data_version, init_template_cache
+
+
+class FakeUser(UserMixin):
+    id = 1
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path / 'instance'))
+    app.config['SECRET_KEY'] = 'test'
+    app.jinja_loader = DictLoader({
+        'tasks.html': '{% cache "tasks" %}Total Tasks {{ total }}{% endcache %}',
+    })
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: FakeUser())
+    init_template_cache(app)
+    app.test_client_class = FlaskLoginClient
+    return app
+
+
+def test_write_between_query_and_render_is_not_cached_under_new_version(app):
+    tasks = []
+
+    @app.route('/dashboard')
+    def dashboard():
+        total = len(tasks)
+        if not tasks:
+            # Another worker commits a task and bumps the version mid-request
+            tasks.append('task')
+            bump_data_version(1)
+        return render_template('tasks.html', total=total)
+
+    client = app.test_client(user=FakeUser())
+    assert client.get('/dashboard').get_data(as_text=True) == 'Total Tasks 0'
+    assert client.get('/dashboard').get_data(as_text=True) == 'Total Tasks 1'